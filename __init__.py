@@ -1,9 +1,18 @@
 """ nv automation module including nv verification automation
 and nv update automation. It contains only the common code.
 """
+import hashlib
+import os
+import sys
 import uuid
-import xml.dom.minidom
-from xml.parsers.expat import ExpatError
+import xml.etree.ElementTree as ElementTree
+
+# The nv xml files are handled with xml.etree.ElementTree. NVParameter.write
+# uses ElementTree.indent, which is available from Python 3.9.
+MIN_PYTHON_VERSION = (3, 9)
+if sys.version_info < MIN_PYTHON_VERSION:
+    raise ImportError("nv automation requires Python %d.%d or later" %
+                      MIN_PYTHON_VERSION)
 
 NEW_DEFINITION_FILE = "new_definition_%s.xml"
 
@@ -14,9 +23,28 @@ NV_TYPE_TA = "TA"
 NV_TYPE_NV = "NV"
 
 
+def _parse_nv_data(nv_data):
+    '''Parse the nv xml data and collect the raw attributes of each NvItem.
+
+    nv_data: content of the nv xml file, bytes type.
+    return: Returns a tuple of (id, name, values, calibrated) tuples.
+    '''
+    root = ElementTree.fromstring(nv_data)
+    return tuple(_get_nv_item_attributes(tag) for tag in root.iter('NvItem'))
+
+
+def _get_nv_item_attributes(tag):
+    '''Return the (id, name, values, calibrated) of a <NvItem> element.
+    '''
+    return (tag.get("id", ""), tag.get("name", ""), tag.text,
+            tag.get("calibrated", ""))
+
+
 class NVItem(object):
     '''Class to hold the nv item attribute and values.
     '''
+    __slots__ = ('nv_id', 'nv_name', 'nv_values', 'nv_type')
+
     def __init__(self, nv_id, nv_name, nv_values, nv_type=NV_TYPE_NV):
         '''Initialization.
 
@@ -55,6 +83,13 @@ class NVAutomation(object):
         # Need to make a unique random filename to avoid conflicts with other
         #file (if any)
         self.new_def_file = NEW_DEFINITION_FILE % uuid.uuid4()
+        # nv items of the new definition file, collected while creating it
+        # so that the file does not need to be parsed again.
+        self._def_nv_items_cache = None
+        # Parsed nv files, as {path: (content digest, nv attributes)}, so the
+        # input file read while creating the new definition file is not
+        # parsed again by verify, unless its content changed.
+        self._nv_file_cache = {}
 
     def read_input_file(self, nv_file=None):
         ''' Read all the input NV ids from input file and return as a list.
@@ -83,17 +118,31 @@ class NVAutomation(object):
         nv_calibrated: nv calibrated. There can be 3 types of values, 'true',
                        'false' and 'ets'.
         '''
-        nv_type = NV_TYPE_NV
+        if nv_id > NV_TYPE_EFS_RANGE:
+            return NV_TYPE_EFS
 
-        if nv_calibrated.strip().lower() == "true":
-            nv_type = NV_TYPE_TA
-        elif nv_calibrated.strip().lower() == "ets":
-            nv_type = NV_TYPE_ETS
+        nv_calibrated = nv_calibrated.strip().lower()
+        if nv_calibrated == "true":
+            return NV_TYPE_TA
+        elif nv_calibrated == "ets":
+            return NV_TYPE_ETS
 
-        if nv_id > NV_TYPE_EFS_RANGE:
-            nv_type = NV_TYPE_EFS
+        return NV_TYPE_NV
+
+    def _create_nv_item(self, nv_id, nv_name, nv_values, nv_calibrated):
+        '''Create the NVItem from the raw attributes of <NvItem>.
 
-        return nv_type
+        nv_id        : id attribute, string type.
+        nv_name      : name attribute, string type.
+        nv_values    : NvItem value, comma separated values as string. None
+                       if the NvItem has no text, e.g. in definition files.
+        nv_calibrated: calibrated attribute, string type.
+        return: Returns the NVItem object.
+        '''
+        nv_id = int(nv_id)
+
+        return NVItem(nv_id, nv_name.strip(), (nv_values or "").strip(),
+                      self._get_nv_type(nv_id, nv_calibrated))
 
     def _read_nv_items(self, nv_file):
         '''Read the nv file and collect the id, name and values of NvItem.
@@ -106,24 +155,26 @@ class NVAutomation(object):
         nv_items = []
 
         try:
-            dom = xml.dom.minidom.parse(nv_file)
-        except ExpatError as err:
+            with open(nv_file, 'rb') as nv_fp:
+                nv_data = nv_fp.read()
+            nv_file = os.path.abspath(nv_file)
+            nv_digest = hashlib.sha1(nv_data).digest()
+            cached = self._nv_file_cache.get(nv_file)
+            if cached is not None and cached[0] == nv_digest:
+                nv_attributes = cached[1]
+            else:
+                nv_attributes = _parse_nv_data(nv_data)
+                self._nv_file_cache[nv_file] = (nv_digest, nv_attributes)
+        except ElementTree.ParseError as err:
             raise NVAutomationError("Error in parsing the input file: %s"
                                     % err)
         except IOError as err:
             raise NVAutomationError("IOError: %s" % err)
 
-        for tag in dom.getElementsByTagName('NvItem'):
-            nv_id = tag.getAttribute("id")
-            nv_name = tag.getAttribute("name")
-            nv_values = tag.childNodes[0].nodeValue
-            nv_calibrated = tag.getAttribute("calibrated")
-
+        # Always create new NVItem objects, the callers may update them.
+        for attributes in nv_attributes:
             try:
-                nv_items.append(NVItem(int(nv_id), nv_name.strip(),
-                                       nv_values.strip(),
-                                       self._get_nv_type(int(nv_id),
-                                                         nv_calibrated)))
+                nv_items.append(self._create_nv_item(*attributes))
             except TypeError as err:
                 raise NVAutomationError("Invalid type NV item found: %s" % err)
             except ValueError as err:
@@ -146,37 +197,66 @@ class NVAutomation(object):
         return:
         This function will return the newly created definition file name.
         '''
-        input_nv_id_list = self.read_input_file()
+        input_nv_ids = set(self.read_input_file())
+        self._def_nv_items_cache = None
+        # Parsed nv files, as {path: (content digest, nv attributes)}, so the
+        # input file read while creating the new definition file is not
+        # parsed again by verify, unless its content changed.
+        self._nv_file_cache = {}
 
         try:
-            dom = xml.dom.minidom.parse(self.definition_file)
-        except ExpatError as err:
-            raise NVAutomationError("Error in parsing the definition file: %s"
-                                    % err)
+            def_events = ElementTree.iterparse(self.definition_file,
+                                               events=('start', 'end'))
         except IOError as err:
             raise NVAutomationError("Error in reading definition file: %s"
                                     % err)
 
         #If any of following operation fails, we don't need further operation.
         try:
-            new_xml_doc = xml.dom.minidom.Document()
-            root_tag = new_xml_doc.createElement('NvDefinition')
-            new_xml_doc.appendChild(root_tag)
-
-            #Also require to include all the <DataType> tags from the
-            #definition file. These are user defined data types that can be
-            #used in NvItem
-            for tag in dom.getElementsByTagName("DataType"):
-                root_tag.appendChild(tag)
-
-            for tag in dom.getElementsByTagName("NvItem"):
-                tag_id = tag.getAttribute("id")
-                for nv_id in input_nv_id_list:
-                    if(nv_id == int(tag_id)):
-                        root_tag.appendChild(tag)
-
-            with open(self.new_def_file, 'w') as fp_xml:
-                new_xml_doc.writexml(fp_xml)
+            def_nv_items = {}
+            nv_item_tags = []
+            root_tag = ElementTree.Element('NvDefinition')
+
+            #Stream through the definition file once, collecting both the
+            #<DataType> and the required <NvItem> tags in the same pass and
+            #keeping only those, so that the whole definition file is never
+            #held in memory.
+            _, def_root = next(def_events)
+            for event, tag in def_events:
+                if event == 'start':
+                    continue
+
+                #Also require to include all the <DataType> tags from the
+                #definition file. These are user defined data types that can be
+                #used in NvItem
+                if tag.tag == "DataType":
+                    root_tag.append(tag)
+                elif tag.tag == "NvItem":
+                    if int(tag.get("id", "")) in input_nv_ids:
+                        nv_item_tags.append(tag)
+                        def_nv_item = self._create_nv_item(
+                            *_get_nv_item_attributes(tag))
+                        def_nv_items.setdefault(
+                            (def_nv_item.nv_id, def_nv_item.nv_name),
+                            def_nv_item)
+                    else:
+                        tag.clear()
+                else:
+                    continue
+                #Drop the whitespace following the tag in the definition file,
+                #so the new definition file is written without padding.
+                tag.tail = None
+                #Release the already processed tags from the definition root.
+                def_root.clear()
+
+            root_tag.extend(nv_item_tags)
+
+            ElementTree.ElementTree(root_tag).write(
+                self.new_def_file, encoding="utf-8", xml_declaration=True)
+            self._def_nv_items_cache = def_nv_items
+        except ElementTree.ParseError as err:
+            raise NVAutomationError("Error in parsing the definition file: %s"
+                                    % err)
         except TypeError as err:
             raise NVAutomationError("Invalid type nv item found: %s" % err)
         except ValueError as err:
@@ -197,13 +277,17 @@ class NVAutomation(object):
         input_nv_item_list: nv item list that needs to be updated with the
                             definition nv items.
         '''
-        def_nv_item_list = self._read_nv_items(self.new_def_file)
+        def_index = self._def_nv_items_cache
+        if def_index is None:
+            # Keep the first definition in case of duplicates.
+            def_index = {}
+            for def_nv_item in self._read_nv_items(self.new_def_file):
+                def_index.setdefault((def_nv_item.nv_id, def_nv_item.nv_name),
+                                     def_nv_item)
 
         for nv_item in input_nv_item_list:
-            for def_nv_item in def_nv_item_list:
-                if (nv_item.nv_id == def_nv_item.nv_id and
-                        nv_item.nv_name == def_nv_item.nv_name):
-                    nv_item.nv_type = def_nv_item.nv_type
-                    break
+            def_nv_item = def_index.get((nv_item.nv_id, nv_item.nv_name))
+            if def_nv_item is not None:
+                nv_item.nv_type = def_nv_item.nv_type
 
         return input_nv_item_list
@@ -1,8 +1,15 @@
-""" Basic classes for nv parameter update. """
+""" Basic classes for nv parameter update.
+
+The xml documents are handled with xml.etree.ElementTree, not
+xml.dom.minidom. NVParameter.parse returns an ElementTree and a list of
+NvItem Elements, and NVParameter.xml_doc is an ElementTree whose root is
+created by NVParameter.create_root. Subclasses use the Element API
+(get, text, append) instead of the minidom one (getAttribute, firstChild,
+createElement, appendChild, documentElement).
+"""
 
 import os
-import xml.dom.minidom as minidom
-from xml.parsers.expat import ExpatError
+import xml.etree.ElementTree as ElementTree
 
 from nv import NVAutomation, NVAutomationError
 
@@ -24,58 +31,98 @@ class NVParameter(NVAutomation):
         '''
         super(NVParameter, self).__init__(definition_file, input_file, None)
         self.target_xml_file = target_xml_file
-        self.xml_doc = minidom.Document()
+        self.xml_doc = ElementTree.ElementTree()
 
     def parse(self, parse_file):
         '''Function to parse the xml file.
 
         parse_file   : xml file needed to be parsed.
         return:
-        parsed_doc   : Whole parsed document.
+        parsed_doc   : Whole parsed document (ElementTree).
         parsed_items : A list of NvItems parsed by tag name "NvItem"
         '''
         try:
-            parsed_doc = minidom.parse(parse_file)
-        except ExpatError as err:
+            parsed_doc = ElementTree.parse(parse_file)
+        except ElementTree.ParseError as err:
             raise NVParameterError("Error in parsing the %s file: %s" %
                                    (parse_file, err))
         except IOError as err:
             raise NVParameterError("Error in reading the %s file: %s" %
                                    (parse_file, err))
-        parsed_items = parsed_doc.getElementsByTagName("NvItem")
+        parsed_items = list(parsed_doc.iter("NvItem"))
         return (parsed_doc, parsed_items)
 
+    def create_root(self, root_name):
+        '''Function to create the root element of xml_doc.
+
+        root_name    : Tag name of the root element.
+        return:
+        root_element : First and only child of xml_doc, to which the
+                       NvItems are appended.
+        '''
+        root_element = ElementTree.Element(root_name)
+        self.xml_doc = ElementTree.ElementTree(root_element)
+        return root_element
+
     def write(self):
         '''Function to write to source file with proper indentation.
+        The indentation uses ElementTree.indent, which requires Python 3.9 or
+        later.
 
         target_xml_file : Source file requested to be updated.
-        xml_doc         : minidom's xml document element.
+        xml_doc         : ElementTree's xml document. Its root element is
+                          created by create_root.
         '''
+        if self.xml_doc.getroot() is None:
+            raise NVParameterError("Nothing to write to %s file: the xml "
+                                   "document has no root element" %
+                                   self.target_xml_file)
         try:
-            with open(self.target_xml_file, 'w') as f:
-                self.xml_doc.writexml(f, indent="", addindent="  ", newl="\n")
+            ElementTree.indent(self.xml_doc, space="  ")
+            with open(self.target_xml_file, 'wb') as f:
+                self.xml_doc.write(f, encoding="utf-8", xml_declaration=True)
         except IOError as err:
             raise NVParameterError("Error while writing to %s file: %s" %
                                    (self.target_xml_file, err))
 
-    def copy_existing(self, nvid, target_items, root_element):
+    def copy_existing(self, nvid, target_items_by_id, root_element):
         '''Function to copy the NvItems that do not need updating from
-        target_items list and append them as child to root_element.
+        the target NvItems and append them as child to root_element.
+
+        nvid               : Id attribute of an NvItem.
+        target_items_by_id : Target NvItems indexed by their id, built once
+                             with index_by_id from the NvItems of parse().
+        root_element       : Root element of xml_doc, see create_root.
 
-        nvid         : Id attribute of an NvItem.
-        target_items : List of NvItems.
-        root_element : First and only child of xml_doc.
+        Example:
+            target_doc, target_items = self.parse(self.target_xml_file)
+            target_items_by_id = self.index_by_id(target_items)
+            for nvid in nvids:
+                self.copy_existing(nvid, target_items_by_id, root_element)
+        '''
+        for target_item in target_items_by_id.get(nvid, ()):
+            try:
+                #Strip the text to remove extra paddings, if any.
+                target_item.text = target_item.text.strip()
+                root_element.append(target_item)
+            except AttributeError as err:
+                raise NVParameterError("Invalid NV item found: %s" % err)
+
+    def index_by_id(self, items):
+        '''Function to index the NvItems by their id attribute.
+
+        items : List of NvItems.
+        return:
+        items_by_id : Dictionary of NV Id to the list of NvItems having it.
         '''
-        for target_item in target_items:
+        items_by_id = {}
+        for item in items:
             try:
-                target_nvid = target_item.getAttribute('id')
-                if nvid == int(target_nvid):
-                    #Strip the nodeValue to remove extra paddings, if any.
-                    target_value = target_item.firstChild.nodeValue.strip()
-                    target_item.firstChild.nodeValue = target_value
-                    root_element.appendChild(target_item)
-            except (ValueError, AttributeError) as err:
+                item_nvid = int(item.get('id', ''))
+            except ValueError as err:
                 raise NVParameterError("Invalid NV item found: %s" % err)
+            items_by_id.setdefault(item_nvid, []).append(item)
+        return items_by_id
 
     def find_unique(self, first_nvids, second_nvids):
         '''Function to identify the NV Ids that are present in first_nvids
@@ -86,4 +133,4 @@ class NVParameter(NVAutomation):
         return:
         list_uniq    : List of NV Ids.
         '''
-        return list(set(first_nvids).difference(set(second_nvids)))
+        return list(set(first_nvids).difference(second_nvids))
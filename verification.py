@@ -2,11 +2,14 @@
 """ Classes for NV Verification Automation. Windows(QCT) and Linux(ETS) will
 be implemented in the same file.
 """
+import collections
+import functools
 import logging
 import optparse
 import os
 import processes
 import re
+import shutil
 
 from nv import NVAutomation, NVAutomationError, NVItem
 
@@ -35,40 +38,92 @@ NV_TYPE_TA = "TA"
 NV_TYPE_NV = "NV"
 
 
+@functools.lru_cache(maxsize=None)
 def command_tool_exists(command_tool):
     ''' Check the command tool in the PATH variable. In QCT tools based
     verification we need to run the command in backend. But this implementation
     is kept as generic. So both in Linux and Windows based system this method
-    can be used.
+    can be used. The result is cached per command tool.
     '''
+    return shutil.which(command_tool) is not None
 
-    def is_exe(fpath):
-        #print os.access(fpath, os.X_OK)
-        return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
 
-    PATH = os.environ["PATH"].split(os.pathsep)
-    for p in PATH:
-        #print os.path.join(p, command_tool)
-        if is_exe(os.path.join(p, command_tool)):
-            return True
+# Number of fields substituted in each row of the report values template
+REPORT_VALUES_FIELDS = 7
+# Only plain %d/%s placeholders and the %% escape are supported in the report
+# values template. Any other conversion, such as %i or %5s, is rejected.
+REPORT_PLACEHOLDER_RE = re.compile(r'(%%|%[ds])')
 
-    return False
 
+@functools.lru_cache(maxsize=None)
+def _split_report_values(report_values):
+    ''' Split the report values template at its %d/%s placeholders, so that a
+    report row can be built by joining the fields with the literal text
+    instead of parsing the format string for every row. The result is cached
+    per template text.
 
-class VerificationItem(object):
+    report_values: report values template having the placeholders.
+
+    return: Returns the literal text around the placeholders as a tuple.
+    '''
+    parts = [""]
+    for token in REPORT_PLACEHOLDER_RE.split(report_values):
+        if token == "%%":
+            parts[-1] += "%"
+        elif token in ("%d", "%s"):
+            parts.append("")
+        elif "%" in token:
+            raise NVAutomationError("Invalid report values template: only "
+                                    "%d and %s placeholders are supported")
+        else:
+            parts[-1] += token
+
+    if len(parts) != REPORT_VALUES_FIELDS + 1:
+        raise NVAutomationError("Invalid report values template: expected %d "
+                                "fields but found %d" %
+                                (REPORT_VALUES_FIELDS, len(parts) - 1))
+
+    return tuple(parts)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_report_template(report_template_file):
+    ''' Read the template text from the template file. The result is cached
+    per template file, so the file is read only once.
+
+    report_template_file: template file to parse.
+
+    return: Returns the template text for report header, values and footer.
+    '''
+    with open(report_template_file) as tem_fp:
+        for line in tem_fp:
+            if "%header%" in line:
+                report_header = line.strip().replace("%header%", "")
+            elif "%values%" in line:
+                report_values = line.strip().replace("%values%", "")
+            elif "%footer%" in line:
+                report_footer = line.strip().replace("%footer%", "")
+
+    return report_header, report_values, report_footer
+
+
+class VerificationItem(collections.namedtuple(
+        'VerificationItem',
+        'input_nv_item output_nv_item verification_result')):
     '''Class to hold the verification items and result together.
+
+    input_nv_item: input nv item that already checked.
+    output_nv_item: output nv item that already checked.
+    verification_result: checked result between input and output nv items
+                         (OK or NG)
     '''
-    def __init__(self, input_nv_item, output_nv_item, result):
-        '''Initialization.
+    __slots__ = ()
 
-        input_nv_item: input nv item that already checked.
-        output_nv_item: output nv item that already checked.
-        result: checked result between input and output nv items
-                (OK or NG)
+    def __new__(cls, input_nv_item, output_nv_item, result):
+        '''Keep the original 'result' argument name of the constructor.
         '''
-        self.input_nv_item = input_nv_item
-        self.output_nv_item = output_nv_item
-        self.verification_result = result
+        return super(VerificationItem, cls).__new__(cls, input_nv_item,
+                                                    output_nv_item, result)
 
 
 class NVAutomationQCT(NVAutomation):
@@ -97,30 +152,30 @@ class NVAutomationQCT(NVAutomation):
         if not input_nv_items or not output_nv_items:
             raise NVAutomationError("Can't verify. "
                                     "Problem in input or output nv items.")
+        # Index the output nv items by (id, name) so that each input nv item
+        # is matched by a single lookup. Keep the first occurrence in case of
+        # duplicates.
+        out_index = {}
+        for out_nv_item in output_nv_items:
+            out_index.setdefault((out_nv_item.nv_id, out_nv_item.nv_name),
+                                 out_nv_item)
+        # Local bindings to avoid repeated attribute lookups in the loop below.
+        find_out_nv_item = out_index.get
+        add_result = verification_result_list.append
         for in_nv_item in input_nv_items:
-            found_matched_in_nv_item = False
-            for out_nv_item in output_nv_items:
-                if (in_nv_item.nv_id == out_nv_item.nv_id and
-                        in_nv_item.nv_name == out_nv_item.nv_name):
-                    found_matched_in_nv_item = True
-                    break
-            if found_matched_in_nv_item:
-                if in_nv_item.nv_values == out_nv_item.nv_values:
-                    verification_item = VerificationItem(in_nv_item,
-                                                         out_nv_item,
-                                                         RESULT_OK)
-                else:
-                    verification_item = VerificationItem(in_nv_item,
-                                                         out_nv_item,
-                                                         RESULT_NG)
-                verification_result_list.append(verification_item)
+            out_nv_item = find_out_nv_item((in_nv_item.nv_id,
+                                            in_nv_item.nv_name))
             # if input nv item found but output nv item not found
             # we will put empty data for the output nv item in the list
+            if out_nv_item is None:
+                add_result(VerificationItem(in_nv_item, NVItem(-1, "", ""),
+                                            RESULT_NG))
+            elif in_nv_item.nv_values == out_nv_item.nv_values:
+                add_result(VerificationItem(in_nv_item, out_nv_item,
+                                            RESULT_OK))
             else:
-                verification_item = VerificationItem(in_nv_item,
-                                                     NVItem(-1, "", ""),
-                                                     RESULT_NG)
-                verification_result_list.append(verification_item)
+                add_result(VerificationItem(in_nv_item, out_nv_item,
+                                            RESULT_NG))
 
         if report_file:
             self.publish_verification_result(verification_result_list,
@@ -136,20 +191,11 @@ class NVAutomationQCT(NVAutomation):
         return: Returns the template text for report header, values and footer.
         '''
         try:
-            with open(report_template_file) as tem_fp:
-                for line in tem_fp.readlines():
-                    if re.search(r'%header%', line):
-                        report_header = line.strip().replace("%header%", "")
-                    elif re.search(r'%values%', line):
-                        report_values = line.strip().replace("%values%", "")
-                    elif re.search(r'%footer%', line):
-                        report_footer = line.strip().replace("%footer%", "")
+            return _load_report_template(report_template_file)
         except IOError as err:
             raise NVAutomationError("Unable to read the template file: %s" %
                                     err)
 
-        return report_header, report_values, report_footer
-
     def publish_verification_result(self, result_list,
                                     report_file=REPORT_FILE):
         '''Simple report to publish the verification result.
@@ -163,32 +209,38 @@ class NVAutomationQCT(NVAutomation):
             summary = REPORT_SUMMARY_FAILED
         REPORT_HEADER, REPORT_VALUES, REPORT_FOOTER = \
             self._read_report_template()
+        value_parts = _split_report_values(REPORT_VALUES)
 
         try:
+            report = [REPORT_HEADER]
+            for result in result_list:
+                # If any result is NG the summary will be FAILED.
+                # This is only valid for non EFS, TA or ETS nv items.
+                nv_item_verification_result = RESULT_PASSED
+                if result.input_nv_item.nv_type == NV_TYPE_NV and \
+                        result.verification_result == RESULT_NG:
+                    nv_item_verification_result = RESULT_FAILED
+                    summary = REPORT_SUMMARY_FAILED
+                # For EFS, TA or ETS nv items, it will be skipped.
+                elif result.input_nv_item.nv_type != NV_TYPE_NV:
+                    nv_item_verification_result = RESULT_SKIPPED
+
+                in_nv_item = result.input_nv_item
+                out_nv_item = result.output_nv_item
+                report.extend((
+                    value_parts[0], str(in_nv_item.nv_id),
+                    value_parts[1], in_nv_item.nv_values,
+                    value_parts[2], out_nv_item.nv_values,
+                    value_parts[3], in_nv_item.nv_name,
+                    value_parts[4], out_nv_item.nv_name,
+                    value_parts[5], in_nv_item.nv_type,
+                    value_parts[6], nv_item_verification_result,
+                    value_parts[7]))
+            report.append(REPORT_FOOTER % summary)
+
+            # Write the whole report at once.
             with open(report_file, "w") as fp:
-                report_values = ""
-                for result in result_list:
-                    # If any result is NG the summary will be FAILED.
-                    # This is only valid for non EFS, TA or ETS nv items.
-                    nv_item_verification_result = RESULT_PASSED
-                    if result.input_nv_item.nv_type == NV_TYPE_NV and \
-                            result.verification_result == RESULT_NG:
-                        nv_item_verification_result = RESULT_FAILED
-                        summary = REPORT_SUMMARY_FAILED
-                    # For EFS, TA or ETS nv items, it will be skipped.
-                    elif result.input_nv_item.nv_type != NV_TYPE_NV:
-                        nv_item_verification_result = RESULT_SKIPPED
-
-                    report_values += REPORT_VALUES % (
-                        result.input_nv_item.nv_id,
-                        result.input_nv_item.nv_values,
-                        result.output_nv_item.nv_values,
-                        result.input_nv_item.nv_name,
-                        result.output_nv_item.nv_name,
-                        result.input_nv_item.nv_type,
-                        nv_item_verification_result)
-                fp.write("%s%s%s" % (REPORT_HEADER, report_values,
-                                     REPORT_FOOTER % summary))
+                fp.write("".join(report))
         except (IOError, TypeError) as err:
             raise NVAutomationError("Unable to publish the result: %s" % err)
 
@@ -214,8 +266,7 @@ class NVAutomationQCT(NVAutomation):
             raise NVAutomationError("Unable to run the QCT command tool: %s" %
                                     err)
         # Verify whether the QCT tool itself run without any error
-        cmd_failed = re.search(r'Command failed', result[1])
-        if cmd_failed:
+        if 'Command failed' in result[1]:
             raise NVAutomationError("Invalid parameter used in QCT command "
                                     "tool.")
 